@@ -3,6 +3,7 @@ from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
     MONGODB_URI: str = "mongodb://localhost:27017"
+    MONGODB_DB: str = "talking_like_ai"
     OPENAI_API_KEY: str = ""
 
     # 三档模型
@@ -16,6 +17,25 @@ class Settings(BaseSettings):
     LLM_MAX_TOKENS_CHAT: int = 1024
     LLM_MAX_TOKENS_ANNOTATION: int = 4096
 
+    # LLM HTTP 连接池
+    LLM_HTTP_MAX_CONNECTIONS: int = 100
+    LLM_HTTP_MAX_KEEPALIVE: int = 20
+    LLM_HTTP_KEEPALIVE_EXPIRY: float = 60.0
+
+    # 启动预热：在 readiness 之前创建 LLM 客户端并连通 Mongo
+    WARMUP_ENABLED: bool = True
+    WARMUP_LLM_CONNECT: bool = True
+    WARMUP_LLM_TIMEOUT_SECONDS: float = 3.0
+
+    PROMPT_CACHE_MAX_SESSIONS: int = 1024  # 每个进程缓存的 session prompt 数量上限
+
+    # 多 worker 共享状态："memory"（单进程）| "mongo"（多 worker / 多节点）
+    SHARED_STATE_BACKEND: str = "memory"
+    SHARED_STATE_LOCK_TTL_SECONDS: float = 30.0  # 持有者存活时由心跳续期
+    SHARED_STATE_LOCK_MAX_HOLD_SECONDS: float = 600.0
+    SESSION_LOCK_TIMEOUT_SECONDS: float = 5.0
+    CHAT_RATE_LIMIT_PER_MINUTE: int = 20  # 每个 session 每分钟对话轮数上限，0 表示不限
+
     model_config = {"env_file": ".env"}
 
 
@@ -28,6 +28,20 @@ class InsufficientMessagesError(AppError):
         super().__init__(f"At least {required} message(s) required before this action")
 
 
+class ResourceBusyError(AppError):
+    status_code: int = 409
+
+    def __init__(self, resource: str):
+        super().__init__(f"{resource} is busy, please retry")
+
+
+class RateLimitedError(AppError):
+    status_code: int = 429
+
+    def __init__(self):
+        super().__init__("Too many requests, please slow down")
+
+
 class LLMError(AppError):
     status_code: int = 502
 
@@ -10,13 +10,24 @@ from app.error_handlers import register_error_handlers
 from app.models import document_models
 from app.routes.health import router as health_router
 from app.routes.session import router as session_router
+from app.services import llm_service
+from app.services.shared_state import init_shared_state
+from app.startup import warm_up
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    app.state.ready = False
     client = AsyncIOMotorClient(settings.MONGODB_URI)
-    await init_beanie(database=client.talking_like_ai, document_models=document_models)
+    database = client[settings.MONGODB_DB]
+    await init_beanie(database=database, document_models=document_models)
+    await init_shared_state(database)
+    if settings.WARMUP_ENABLED:
+        await warm_up(database)
+    app.state.ready = True
     yield
+    app.state.ready = False
+    await llm_service.close()
     client.close()
 
 
@@ -28,6 +39,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 
 register_error_handlers(app)
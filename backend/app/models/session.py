@@ -39,6 +39,7 @@ class Session(Document):
     annotations: list[Annotation] = Field(default_factory=list)
     created_at: datetime = Field(default_factory=lambda: datetime.now(UTC))
     updated_at: datetime = Field(default_factory=lambda: datetime.now(UTC))
+    revision: int = 0  # 每次写入 +1，用作 ETag
 
     class Settings:
         name = "sessions"
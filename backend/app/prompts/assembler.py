@@ -0,0 +1,76 @@
+"""Per-session OpenAI message lists that only convert messages added since the last turn."""
+
+from collections import OrderedDict
+from collections.abc import Callable
+
+from app.config import settings
+from app.models.session import Message
+from app.prompts.builder import to_openai_message
+
+
+class PromptAssembler:
+    def __init__(self, system_prompt: str):
+        self._messages: list[dict] = [{"role": "system", "content": system_prompt}]
+        self._synced = 0
+
+    def _sync(self, history: list[Message]) -> None:
+        if len(history) < self._synced:
+            # 历史变短说明不是同一份追加记录，整体重建
+            del self._messages[1:]
+            self._synced = 0
+        for i in range(self._synced, len(history)):
+            self._messages.append(to_openai_message(history[i]))
+        self._synced = len(history)
+
+    def messages(
+        self,
+        history: list[Message],
+        extra_user_message: str | None = None,
+    ) -> list[dict]:
+        """OpenAI messages for `history`. The returned list is shared: treat it as read-only."""
+        self._sync(history)
+        if extra_user_message:
+            return [*self._messages, {"role": "user", "content": extra_user_message}]
+        return self._messages
+
+
+_cache: OrderedDict[tuple[str, str], PromptAssembler] = OrderedDict()
+
+
+def get_assembler(
+    session_id: str,
+    stage: str,
+    system_prompt: Callable[[], str],
+) -> PromptAssembler:
+    """Cached assembler for (session, stage); `system_prompt` is only called on a miss."""
+    key = (session_id, stage)
+    assembler = _cache.get(key)
+    if assembler is None:
+        assembler = _cache[key] = PromptAssembler(system_prompt())
+        if len(_cache) > settings.PROMPT_CACHE_MAX_SESSIONS:
+            _cache.popitem(last=False)
+    else:
+        _cache.move_to_end(key)
+    return assembler
+
+
+def transcript(
+    session_id: str,
+    stage: str,
+    history: list[Message],
+    labels: dict[str, str],
+) -> str:
+    """Plain-text transcript, one `[label]: content` line per message (keyed by OpenAI role).
+
+    Reuses an already cached assembler but never adds one on a miss.
+    """
+    cached = _cache.get((session_id, stage))
+    messages = cached.messages(history)[1:] if cached else map(to_openai_message, history)
+    return "\n".join(f"[{labels[m['role']]}]: {m['content']}" for m in messages)
+
+
+def drop(session_id: str) -> None:
+    """Forget a session's assemblers once it can no longer chat."""
+    for key in [k for k in _cache if k[0] == session_id]:
+        del _cache[key]
+
@@ -1,6 +1,11 @@
 from app.models.session import Message
 
 
+def to_openai_message(msg: Message) -> dict:
+    """Internal role "ai" is mapped to OpenAI "assistant"."""
+    return {"role": "assistant" if msg.role == "ai" else "user", "content": msg.content}
+
+
 def build_messages(
     system_prompt: str,
     history: list[Message],
@@ -12,9 +17,7 @@ def build_messages(
     """
     messages: list[dict] = [{"role": "system", "content": system_prompt}]
 
-    for msg in history:
-        role = "assistant" if msg.role == "ai" else "user"
-        messages.append({"role": role, "content": msg.content})
+    messages.extend(to_openai_message(msg) for msg in history)
 
     if extra_user_message:
         messages.append({"role": "user", "content": extra_user_message})
@@ -1,4 +1,5 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Request
+from fastapi.responses import JSONResponse
 
 router = APIRouter(prefix="/api", tags=["health"])
 
@@ -6,3 +7,15 @@ router = APIRouter(prefix="/api", tags=["health"])
 @router.get("/health")
 async def health():
     return {"status": "ok"}
+
+
+@router.get("/ready")
+async def ready(request: Request):
+    """Readiness probe: 503 only once shutdown has started.
+
+    uvicorn serves nothing until lifespan startup (warm-up included) returns, so a
+    starting worker is simply unreachable rather than "not ready".
+    """
+    if not getattr(request.app.state, "ready", False):
+        return JSONResponse(status_code=503, content={"status": "stopping"})
+    return {"status": "ok"}
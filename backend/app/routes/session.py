@@ -1,5 +1,6 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Query, Request, Response
 from sse_starlette.sse import EventSourceResponse
+from starlette.background import BackgroundTask
 
 from app.exceptions import AppError
 from app.schemas.session import ChatRequest, IssueSubmit, MoodRatingRequest
@@ -19,14 +20,54 @@ async def _wrap_sse(generator):
         yield session_service._sse_event("error", {"detail": str(e)})
 
 
+def _sse_response(stream: session_service.SessionStream) -> EventSourceResponse:
+    # 生成器可能从未启动（客户端在首包前断开），background 兜底释放会话锁
+    return EventSourceResponse(
+        _wrap_sse(stream.events),
+        background=BackgroundTask(stream.lease.release),
+    )
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """If-None-Match uses weak comparison: W/ prefixes are ignored (RFC 9110 §13.1.2)."""
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(
+        candidate.strip().removeprefix("W/") == opaque
+        for candidate in if_none_match.split(",")
+    )
+
+
 @router.post("/")
 async def create_session():
     return await session_service.create_session()
 
 
 @router.get("/{session_id}")
-async def get_session(session_id: str):
-    return await session_service.get_session(session_id)
+async def get_session(
+    session_id: str,
+    request: Request,
+    stage2_since_index: int = Query(0, ge=0),
+    stage3_since_index: int = Query(0, ge=0),
+    wait: float = Query(0, ge=0, le=30),
+):
+    """Conditional GET; with `wait` > 0 an unchanged session is long-polled before the 304."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        revision = await session_service.get_session_revision(session_id)
+        if wait and _etag_matches(if_none_match, session_service.session_etag(revision)):
+            revision = await session_service.wait_for_session_change(session_id, revision, wait)
+        etag = session_service.session_etag(revision)
+        if _etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers={"ETag": etag})
+
+    out = await session_service.get_session(session_id, stage2_since_index, stage3_since_index)
+    return Response(
+        content=out.model_dump_json(),
+        media_type="application/json",
+        headers={"ETag": session_service.session_etag(out.revision)},
+    )
 
 
 @router.post("/{session_id}/issue")
@@ -36,7 +77,7 @@ async def submit_issue(session_id: str, body: IssueSubmit):
 
 @router.post("/{session_id}/stage2/chat")
 async def stage2_chat(session_id: str, body: ChatRequest):
-    return EventSourceResponse(_wrap_sse(session_service.stage2_chat(session_id, body.content)))
+    return _sse_response(await session_service.stage2_chat(session_id, body.content))
 
 
 @router.post("/{session_id}/stage2/mood")
@@ -46,12 +87,12 @@ async def save_mood_rating(session_id: str, body: MoodRatingRequest):
 
 @router.post("/{session_id}/stage2/complete")
 async def complete_stage2(session_id: str):
-    return EventSourceResponse(_wrap_sse(session_service.complete_stage2(session_id)))
+    return _sse_response(await session_service.complete_stage2(session_id))
 
 
 @router.post("/{session_id}/stage3/chat")
 async def stage3_chat(session_id: str, body: ChatRequest):
-    return EventSourceResponse(_wrap_sse(session_service.stage3_chat(session_id, body.content)))
+    return _sse_response(await session_service.stage3_chat(session_id, body.content))
 
 
 @router.post("/{session_id}/stage3/complete")
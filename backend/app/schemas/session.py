@@ -43,3 +43,4 @@ class SessionOut(BaseModel):
     annotations: list[Annotation] = []
     created_at: datetime
     updated_at: datetime
+    revision: int = 0
@@ -2,7 +2,8 @@ import json
 import logging
 from collections.abc import AsyncGenerator
 
-from openai import AsyncOpenAI
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
 
 from app.config import settings
 from app.exceptions import LLMError
@@ -15,10 +16,36 @@ _client: AsyncOpenAI | None = None
 def _get_client() -> AsyncOpenAI:
     global _client
     if _client is None:
-        _client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+        _client = AsyncOpenAI(
+            api_key=settings.OPENAI_API_KEY,
+            http_client=DefaultAsyncHttpxClient(
+                limits=httpx.Limits(
+                    max_connections=settings.LLM_HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.LLM_HTTP_MAX_KEEPALIVE,
+                    keepalive_expiry=settings.LLM_HTTP_KEEPALIVE_EXPIRY,
+                ),
+            ),
+        )
     return _client
 
 
+async def warm_up(connect: bool = True) -> None:
+    """Create the client and, optionally, open a pooled TLS connection to the API."""
+    client = _get_client()
+    if connect:
+        # models.retrieve 不消耗 token，只用来建立连接；短超时、不重试，避免拖住启动
+        await client.with_options(
+            timeout=settings.WARMUP_LLM_TIMEOUT_SECONDS, max_retries=0
+        ).models.retrieve(settings.MODEL_MAIN)
+
+
+async def close() -> None:
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
+
+
 async def stream_chat(
     messages: list[dict],
     model: str = settings.MODEL_MAIN,
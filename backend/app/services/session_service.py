@@ -1,6 +1,8 @@
 import json
 import logging
-from collections.abc import AsyncGenerator
+from collections.abc import AsyncGenerator, Callable
+from contextlib import aclosing
+from dataclasses import dataclass
 from datetime import UTC, datetime
 
 from beanie import PydanticObjectId
@@ -9,29 +11,44 @@ from app.exceptions import (
     InsufficientMessagesError,
     InvalidStageError,
     ModerationError,
+    RateLimitedError,
     SessionNotFoundError,
 )
 from app.models.session import Annotation, Message, MoodRating, Session, SessionStage
-from app.prompts import stage2, stage3, stage4
+from app.prompts import assembler, stage2, stage3, stage4
 from app.prompts.builder import build_messages
 from app.schemas.session import SessionOut
 from app.config import settings
 from app.services import llm_service, moderation_service
+from app.services.shared_state import Lease, get_shared_state
 
 logger = logging.getLogger(__name__)
 
 
-async def _get_session(session_id: str) -> Session:
+# $slice 的 limit 必须为正数，用一个足够大的值表示"取到末尾"
+_SLICE_TO_END = 2**31 - 1
+
+
+def _parse_oid(session_id: str) -> PydanticObjectId:
     try:
-        oid = PydanticObjectId(session_id)
+        return PydanticObjectId(session_id)
     except Exception as e:
         raise SessionNotFoundError(session_id) from e
+
+
+async def _get_session(session_id: str) -> Session:
+    oid = _parse_oid(session_id)
     session = await Session.get(oid)
     if session is None:
         raise SessionNotFoundError(session_id)
     return session
 
 
+def session_etag(revision: int) -> str:
+    """Weak ETag derived from the session revision (bumped by every write via _touch)."""
+    return f'W/"{revision}"'
+
+
 def _to_out(session: Session) -> SessionOut:
     return SessionOut(
         id=str(session.id),
@@ -49,17 +66,78 @@ def _to_out(session: Session) -> SessionOut:
         annotations=session.annotations,
         created_at=session.created_at,
         updated_at=session.updated_at,
+        revision=session.revision,
     )
 
 
 async def _touch(session: Session) -> None:
     session.updated_at = datetime.now(UTC)
+    session.revision += 1
     await session.save()
+    # 唤醒长轮询 GET（见 wait_for_session_change）
+    await get_shared_state().publish(f"session:{session.id}", session.revision)
 
 
 async def _terminate_session(session: Session) -> None:
     session.stage = SessionStage.TERMINATED
     await _touch(session)
+    assembler.drop(str(session.id))
+
+
+def _session_lock(session_id: str):
+    """Serialise writes to one session across workers (read-modify-write on the whole doc)."""
+    return get_shared_state().lock(
+        f"session:{session_id}", timeout=settings.SESSION_LOCK_TIMEOUT_SECONDS
+    )
+
+
+@dataclass
+class SessionStream:
+    """SSE events for a session whose lock is already held.
+
+    `events` releases the lease when it finishes; callers must also release it
+    if the stream is never started (release is idempotent).
+    """
+
+    events: AsyncGenerator[dict]
+    lease: Lease
+
+
+async def _open_stream(
+    session_id: str,
+    expected: SessionStage,
+    events: Callable[[Session], AsyncGenerator[dict]],
+    validate: Callable[[Session], None] | None = None,
+) -> SessionStream:
+    """Lock and validate before any SSE bytes go out, so failures are real HTTP errors."""
+    lease = await get_shared_state().acquire(
+        f"session:{session_id}", timeout=settings.SESSION_LOCK_TIMEOUT_SECONDS
+    )
+    try:
+        session = await _get_session(session_id)
+        if session.stage != expected:
+            raise InvalidStageError(session.stage.value, expected.value)
+        if validate is not None:
+            validate(session)
+    except BaseException:
+        await lease.release()
+        raise
+
+    async def run() -> AsyncGenerator[dict]:
+        try:
+            async with aclosing(events(session)) as stream:
+                async for event in stream:
+                    yield event
+        finally:
+            await lease.release()
+
+    return SessionStream(events=run(), lease=lease)
+
+
+async def _check_chat_rate(session_id: str) -> None:
+    limit = settings.CHAT_RATE_LIMIT_PER_MINUTE
+    if limit and await get_shared_state().incr(f"chat:{session_id}", 60) > limit:
+        raise RateLimitedError()
 
 
 def _sse_event(event: str, data: dict) -> dict:
@@ -75,32 +153,64 @@ async def create_session() -> dict:
     return {"id": str(session.id), "stage": session.stage}
 
 
-async def get_session(session_id: str) -> SessionOut:
-    session = await _get_session(session_id)
-    return _to_out(session)
+async def get_session_revision(session_id: str) -> int:
+    """Fetch only the revision to answer conditional GETs without loading the transcript."""
+    oid = _parse_oid(session_id)
+    raw = await Session.get_pymongo_collection().find_one(
+        {"_id": oid}, projection={"_id": 0, "revision": 1}
+    )
+    if raw is None:
+        raise SessionNotFoundError(session_id)
+    return raw.get("revision", 0)
+
+
+async def wait_for_session_change(session_id: str, revision: int, timeout: float) -> int:
+    """Long-poll: wait up to `timeout` for a write past `revision`, then return the stored revision."""
+    await get_shared_state().wait_for_change(f"session:{session_id}", revision, timeout)
+    return await get_session_revision(session_id)
+
+
+async def get_session(
+    session_id: str,
+    stage2_since_index: int = 0,
+    stage3_since_index: int = 0,
+) -> SessionOut:
+    """Read path: project out already-seen messages and validate the raw document once.
+
+    Skips building Session/Message documents; message lists start at the given index.
+    """
+    oid = _parse_oid(session_id)
+    raw = await Session.get_pymongo_collection().find_one(
+        {"_id": oid},
+        projection={
+            "stage2_messages": {"$slice": [stage2_since_index, _SLICE_TO_END]},
+            "stage3_messages": {"$slice": [stage3_since_index, _SLICE_TO_END]},
+        },
+    )
+    if raw is None:
+        raise SessionNotFoundError(session_id)
+    raw["id"] = str(raw.pop("_id"))
+    return SessionOut.model_validate(raw)
 
 
 async def submit_issue(session_id: str, content: str) -> SessionOut:
-    session = await _get_session(session_id)
-    if session.stage != SessionStage.INPUT:
-        raise InvalidStageError(session.stage.value, SessionStage.INPUT.value)
-
-    mod = await moderation_service.check(content)
-    if not mod.passed:
-        await _terminate_session(session)
-        raise ModerationError()
+    async with _session_lock(session_id):
+        session = await _get_session(session_id)
+        if session.stage != SessionStage.INPUT:
+            raise InvalidStageError(session.stage.value, SessionStage.INPUT.value)
 
-    session.user_issue = content
-    session.stage = SessionStage.CONVERSATION
-    await _touch(session)
-    return _to_out(session)
+        mod = await moderation_service.check(content)
+        if not mod.passed:
+            await _terminate_session(session)
+            raise ModerationError()
 
+        session.user_issue = content
+        session.stage = SessionStage.CONVERSATION
+        await _touch(session)
+        return _to_out(session)
 
-async def stage2_chat(session_id: str, content: str) -> AsyncGenerator[dict]:
-    session = await _get_session(session_id)
-    if session.stage != SessionStage.CONVERSATION:
-        raise InvalidStageError(session.stage.value, SessionStage.CONVERSATION.value)
 
+async def _stage2_chat_events(session: Session, content: str) -> AsyncGenerator[dict]:
     mod = await moderation_service.check(content)
     if not mod.passed:
         await _terminate_session(session)
@@ -113,8 +223,12 @@ async def stage2_chat(session_id: str, content: str) -> AsyncGenerator[dict]:
     await _touch(session)
 
     # Build prompt and stream AI response (主力模型)
-    system_prompt = stage2.SYSTEM_PROMPT.format(user_issue=session.user_issue)
-    messages = build_messages(system_prompt, session.stage2_messages)
+    prompt = assembler.get_assembler(
+        str(session.id),
+        "stage2",
+        lambda: stage2.SYSTEM_PROMPT.format(user_issue=session.user_issue),
+    )
+    messages = prompt.messages(session.stage2_messages)
     full_content = ""
 
     async for token in llm_service.stream_chat(messages, model=settings.MODEL_MAIN):
@@ -129,30 +243,35 @@ async def stage2_chat(session_id: str, content: str) -> AsyncGenerator[dict]:
     yield _sse_event("done", {"message_index": len(session.stage2_messages) - 1})
 
 
-async def save_mood_rating(session_id: str, value: int) -> SessionOut:
-    session = await _get_session(session_id)
-    if session.stage != SessionStage.CONVERSATION:
-        raise InvalidStageError(session.stage.value, SessionStage.CONVERSATION.value)
-
-    rating = MoodRating(
-        value=value,
-        after_message_index=len(session.stage2_messages) - 1,
+async def stage2_chat(session_id: str, content: str) -> SessionStream:
+    await _check_chat_rate(session_id)
+    return await _open_stream(
+        session_id,
+        SessionStage.CONVERSATION,
+        lambda session: _stage2_chat_events(session, content),
     )
-    session.mood_ratings.append(rating)
-    await _touch(session)
-    return _to_out(session)
 
 
-async def complete_stage2(session_id: str) -> AsyncGenerator[dict]:
-    session = await _get_session(session_id)
-    if session.stage != SessionStage.CONVERSATION:
-        raise InvalidStageError(session.stage.value, SessionStage.CONVERSATION.value)
-    if len(session.stage2_messages) < 2:
-        raise InsufficientMessagesError(2)
+async def save_mood_rating(session_id: str, value: int) -> SessionOut:
+    async with _session_lock(session_id):
+        session = await _get_session(session_id)
+        if session.stage != SessionStage.CONVERSATION:
+            raise InvalidStageError(session.stage.value, SessionStage.CONVERSATION.value)
+
+        rating = MoodRating(
+            value=value,
+            after_message_index=len(session.stage2_messages) - 1,
+        )
+        session.mood_ratings.append(rating)
+        await _touch(session)
+        return _to_out(session)
+
 
+async def _complete_stage2_events(session: Session) -> AsyncGenerator[dict]:
     # Transition to ROLE_SWAP
     session.stage = SessionStage.ROLE_SWAP
     await _touch(session)
+    assembler.drop(str(session.id))
 
     # Generate AI opening message for stage 3 (主力模型)
     opening_prompt = stage3.OPENING_PROMPT.format(user_issue=session.user_issue)
@@ -171,11 +290,17 @@ async def complete_stage2(session_id: str) -> AsyncGenerator[dict]:
     yield _sse_event("done", {"message_index": 0})
 
 
-async def stage3_chat(session_id: str, content: str) -> AsyncGenerator[dict]:
-    session = await _get_session(session_id)
-    if session.stage != SessionStage.ROLE_SWAP:
-        raise InvalidStageError(session.stage.value, SessionStage.ROLE_SWAP.value)
+async def complete_stage2(session_id: str) -> SessionStream:
+    def validate(session: Session) -> None:
+        if len(session.stage2_messages) < 2:
+            raise InsufficientMessagesError(2)
+
+    return await _open_stream(
+        session_id, SessionStage.CONVERSATION, _complete_stage2_events, validate
+    )
 
+
+async def _stage3_chat_events(session: Session, content: str) -> AsyncGenerator[dict]:
     mod = await moderation_service.check(content)
     if not mod.passed:
         await _terminate_session(session)
@@ -188,7 +313,8 @@ async def stage3_chat(session_id: str, content: str) -> AsyncGenerator[dict]:
     await _touch(session)
 
     # Build prompt and stream AI response (主力模型)
-    messages = build_messages(stage3.SYSTEM_PROMPT, session.stage3_messages)
+    prompt = assembler.get_assembler(str(session.id), "stage3", lambda: stage3.SYSTEM_PROMPT)
+    messages = prompt.messages(session.stage3_messages)
     full_content = ""
 
     async for token in llm_service.stream_chat(messages, model=settings.MODEL_MAIN):
@@ -203,32 +329,45 @@ async def stage3_chat(session_id: str, content: str) -> AsyncGenerator[dict]:
     yield _sse_event("done", {"message_index": len(session.stage3_messages) - 1})
 
 
-async def complete_stage3(session_id: str) -> SessionOut:
-    session = await _get_session(session_id)
-    if session.stage != SessionStage.ROLE_SWAP:
-        raise InvalidStageError(session.stage.value, SessionStage.ROLE_SWAP.value)
-    if len(session.stage3_messages) < 2:
-        raise InsufficientMessagesError(2)
-
-    # Build stage3 conversation text for annotation
-    conversation_text = "\n".join(
-        f"[{'倾诉者' if m.role == 'ai' else '倾听者'}]: {m.content}"
-        for m in session.stage3_messages
-    )
-    messages = build_messages(
-        stage4.SYSTEM_PROMPT,
-        [],
-        extra_user_message=f"以下是对话内容：\n\n{conversation_text}",
+async def stage3_chat(session_id: str, content: str) -> SessionStream:
+    await _check_chat_rate(session_id)
+    return await _open_stream(
+        session_id,
+        SessionStage.ROLE_SWAP,
+        lambda session: _stage3_chat_events(session, content),
     )
 
-    result = await llm_service.json_chat(messages, model=settings.MODEL_STRONG)
 
-    # Parse annotations
-    raw_annotations = result.get("annotations", [])
-    session.annotations = [
-        Annotation(message_index=a["message_index"], content=a["content"])
-        for a in raw_annotations
-    ]
-    session.stage = SessionStage.REVIEW
-    await _touch(session)
-    return _to_out(session)
+async def complete_stage3(session_id: str) -> SessionOut:
+    async with _session_lock(session_id):
+        session = await _get_session(session_id)
+        if session.stage != SessionStage.ROLE_SWAP:
+            raise InvalidStageError(session.stage.value, SessionStage.ROLE_SWAP.value)
+        if len(session.stage3_messages) < 2:
+            raise InsufficientMessagesError(2)
+
+        # Build stage3 conversation text for annotation
+        conversation_text = assembler.transcript(
+            str(session.id),
+            "stage3",
+            session.stage3_messages,
+            {"assistant": "倾诉者", "user": "倾听者"},
+        )
+        messages = build_messages(
+            stage4.SYSTEM_PROMPT,
+            [],
+            extra_user_message=f"以下是对话内容：\n\n{conversation_text}",
+        )
+
+        result = await llm_service.json_chat(messages, model=settings.MODEL_STRONG)
+
+        # Parse annotations
+        raw_annotations = result.get("annotations", [])
+        session.annotations = [
+            Annotation(message_index=a["message_index"], content=a["content"])
+            for a in raw_annotations
+        ]
+        session.stage = SessionStage.REVIEW
+        await _touch(session)
+        assembler.drop(str(session.id))
+        return _to_out(session)
@@ -0,0 +1,290 @@
+"""Cross-worker shared state: locks, windowed counters and change notification.
+
+Anything that must stay correct when `main.app` runs under several uvicorn
+workers (or several nodes) goes through this module instead of module-level
+globals. Per-process resources such as the OpenAI HTTP pool in llm_service
+stay per process on purpose — they hold no application state.
+
+Backends:
+- "memory": in-process, only correct with a single worker (default, dev).
+- "mongo": stored in the app database, safe across workers and nodes.
+"""
+
+import asyncio
+import logging
+import time
+import uuid
+import weakref
+from abc import ABC, abstractmethod
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from datetime import UTC, datetime, timedelta
+
+import anyio
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from app.config import settings
+from app.exceptions import ResourceBusyError
+
+logger = logging.getLogger(__name__)
+
+# channel 版本只用于唤醒等待者，过期删除后等待者只是超时再回源查询
+_CHANNEL_RETENTION = timedelta(days=1)
+
+# 单进程后端里计数器 / channel 版本的条目上限，按 session 建 key，不设上限会一直增长
+_MAX_IN_PROCESS_ENTRIES = 1024
+
+
+class Lease(ABC):
+    """A held lock. release() is idempotent and survives cancellation."""
+
+    def __init__(self, key: str) -> None:
+        self.key = key
+        self._released = False
+
+    async def release(self) -> None:
+        if self._released:
+            return
+        self._released = True
+        # 客户端断开时 sse_starlette 会取消所在的 cancel scope，屏蔽取消以确保锁真正释放
+        with anyio.CancelScope(shield=True):
+            await self._release()
+
+    @abstractmethod
+    async def _release(self) -> None: ...
+
+
+class SharedState(ABC):
+    async def init(self) -> None:
+        """Prepare backend resources (indexes etc.). Called once at startup."""
+
+    @abstractmethod
+    async def acquire(self, key: str, timeout: float = 0.0) -> Lease:
+        """Take an exclusive lock on `key`.
+
+        Raises ResourceBusyError if it is not acquired within `timeout` seconds.
+        """
+
+    @asynccontextmanager
+    async def lock(self, key: str, timeout: float = 0.0) -> AsyncIterator[Lease]:
+        lease = await self.acquire(key, timeout)
+        try:
+            yield lease
+        finally:
+            await lease.release()
+
+    @abstractmethod
+    async def incr(self, key: str, window_seconds: int) -> int:
+        """Increment a fixed-window counter and return the count in the current window."""
+
+    @abstractmethod
+    async def publish(self, channel: str, version: int) -> None:
+        """Announce that `channel` reached `version` (versions only move forward)."""
+
+    @abstractmethod
+    async def wait_for_change(self, channel: str, since: int, timeout: float) -> int:
+        """Wait until `channel` moves past version `since` or `timeout` elapses.
+
+        Returns the latest known version (at most `since` on timeout).
+        """
+
+
+class _InProcessLease(Lease):
+    def __init__(self, key: str, lock: asyncio.Lock) -> None:
+        super().__init__(key)
+        self._lock = lock
+
+    async def _release(self):
+        self._lock.release()
+
+
+class InProcessState(SharedState):
+    def __init__(self) -> None:
+        # 弱引用：没有持有者/等待者时锁对象自动回收，避免按 session 无限增长
+        self._locks: weakref.WeakValueDictionary[str, asyncio.Lock] = (
+            weakref.WeakValueDictionary()
+        )
+        self._counters: dict[str, tuple[float, int]] = {}
+        self._versions: dict[str, int] = {}
+        self._changed = asyncio.Condition()
+
+    async def acquire(self, key, timeout=0.0):
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        if timeout <= 0 and lock.locked():
+            raise ResourceBusyError(key)
+        try:
+            await asyncio.wait_for(lock.acquire(), timeout=max(timeout, 0) or None)
+        except TimeoutError as e:
+            raise ResourceBusyError(key) from e
+        return _InProcessLease(key, lock)
+
+    async def incr(self, key, window_seconds):
+        now = time.time()
+        if len(self._counters) > _MAX_IN_PROCESS_ENTRIES:
+            self._counters = {k: v for k, v in self._counters.items() if v[0] > now}
+        window_end = (now // window_seconds + 1) * window_seconds
+        expires_at, count = self._counters.get(key, (window_end, 0))
+        if expires_at != window_end:
+            count = 0
+        self._counters[key] = (window_end, count + 1)
+        return count + 1
+
+    async def publish(self, channel, version):
+        async with self._changed:
+            if version > self._versions.get(channel, 0):
+                # 重新插入使字典按最近发布排序，超限时淘汰最久没有发布的 channel；
+                # 被淘汰的 channel 读作 0，等待者最多等到超时再回源查询
+                self._versions.pop(channel, None)
+                self._versions[channel] = version
+                if len(self._versions) > _MAX_IN_PROCESS_ENTRIES:
+                    del self._versions[next(iter(self._versions))]
+                self._changed.notify_all()
+
+    async def wait_for_change(self, channel, since, timeout):
+        async with self._changed:
+            try:
+                await asyncio.wait_for(
+                    self._changed.wait_for(lambda: self._versions.get(channel, 0) > since),
+                    timeout=timeout,
+                )
+            except TimeoutError:
+                pass
+            return self._versions.get(channel, 0)
+
+
+class _MongoLease(Lease):
+    """Lease document kept alive by a heartbeat while the holder is running.
+
+    The heartbeat stops after SHARED_STATE_LOCK_MAX_HOLD_SECONDS, so a lease
+    that is never released still expires one TTL later.
+    """
+
+    def __init__(self, key: str, owner: str, collection, ttl: float) -> None:
+        super().__init__(key)
+        self._owner = owner
+        self._locks = collection
+        self._ttl = ttl
+        self._heartbeat = asyncio.create_task(self._renew())
+
+    async def _renew(self) -> None:
+        deadline = time.monotonic() + settings.SHARED_STATE_LOCK_MAX_HOLD_SECONDS
+        while time.monotonic() < deadline:
+            await asyncio.sleep(self._ttl / 3)
+            try:
+                result = await self._locks.update_one(
+                    {"_id": self.key, "owner": self._owner},
+                    {"$set": {"expires_at": datetime.now(UTC) + timedelta(seconds=self._ttl)}},
+                )
+            except Exception as e:
+                logger.warning("Lock heartbeat for %s failed: %s", self.key, e)
+                continue
+            if result.matched_count == 0:
+                logger.warning("Lock %s was lost before release", self.key)
+                return
+        logger.warning("Lock %s held past max hold time, letting it expire", self.key)
+
+    async def _release(self):
+        self._heartbeat.cancel()
+        await self._locks.delete_one({"_id": self.key, "owner": self._owner})
+
+
+class MongoState(SharedState):
+    """Shared state kept in three small collections of the app database.
+
+    Locks are heartbeated lease documents (owner + expires_at) so a crashed
+    worker cannot hold a lock for longer than one TTL; notification is
+    version polling, which works on standalone Mongo where change streams
+    are unavailable.
+    """
+
+    def __init__(self, database, poll_interval: float = 0.2) -> None:
+        self._locks = database["state_locks"]
+        self._counters = database["state_counters"]
+        self._channels = database["state_channels"]
+        self._poll_interval = poll_interval
+
+    async def init(self):
+        # TTL 索引只做垃圾回收（后台约每 60 秒清理一次），正确性由 expires_at 判断保证
+        await self._locks.create_index("expires_at", expireAfterSeconds=0)
+        await self._counters.create_index("expires_at", expireAfterSeconds=0)
+        await self._channels.create_index("expires_at", expireAfterSeconds=0)
+
+    async def _try_acquire(self, key: str, owner: str, ttl: float) -> bool:
+        now = datetime.now(UTC)
+        try:
+            # 锁不存在 → upsert 插入；已过期 → 接管；仍被持有 → _id 冲突
+            await self._locks.update_one(
+                {"_id": key, "expires_at": {"$lt": now}},
+                {"$set": {"owner": owner, "expires_at": now + timedelta(seconds=ttl)}},
+                upsert=True,
+            )
+            return True
+        except DuplicateKeyError:
+            return False
+
+    async def acquire(self, key, timeout=0.0):
+        owner = uuid.uuid4().hex
+        ttl = settings.SHARED_STATE_LOCK_TTL_SECONDS
+        deadline = time.monotonic() + timeout
+        while not await self._try_acquire(key, owner, ttl):
+            if time.monotonic() >= deadline:
+                raise ResourceBusyError(key)
+            await asyncio.sleep(self._poll_interval)
+        return _MongoLease(key, owner, self._locks, ttl)
+
+    async def incr(self, key, window_seconds):
+        window = int(time.time() // window_seconds)
+        expires_at = datetime.fromtimestamp((window + 1) * window_seconds, UTC)
+        doc = await self._counters.find_one_and_update(
+            {"_id": f"{key}:{window}"},
+            {"$inc": {"value": 1}, "$setOnInsert": {"expires_at": expires_at}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        return doc["value"]
+
+    async def publish(self, channel, version):
+        await self._channels.update_one(
+            {"_id": channel},
+            {
+                "$max": {"version": version},
+                "$set": {"expires_at": datetime.now(UTC) + _CHANNEL_RETENTION},
+            },
+            upsert=True,
+        )
+
+    async def wait_for_change(self, channel, since, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            doc = await self._channels.find_one({"_id": channel})
+            version = doc["version"] if doc else 0
+            if version > since or time.monotonic() >= deadline:
+                return version
+            await asyncio.sleep(self._poll_interval)
+
+
+_state: SharedState | None = None
+
+
+async def init_shared_state(database) -> SharedState:
+    global _state
+    backend = settings.SHARED_STATE_BACKEND
+    if backend == "mongo":
+        _state = MongoState(database)
+    elif backend == "memory":
+        _state = InProcessState()
+    else:
+        raise ValueError(f"Unknown SHARED_STATE_BACKEND: {backend}")
+    await _state.init()
+    logger.info("Shared state backend: %s", backend)
+    return _state
+
+
+def get_shared_state() -> SharedState:
+    global _state
+    if _state is None:
+        _state = InProcessState()
+    return _state
@@ -0,0 +1,35 @@
+"""Startup warm-up: pay first-request connection costs before serving traffic."""
+
+import logging
+import time
+
+from app.config import settings
+from app.services import llm_service
+
+logger = logging.getLogger(__name__)
+
+
+async def warm_up(database) -> dict[str, float]:
+    """Pay first-request costs up front. Returns step durations in ms.
+
+    LLM connect failures are logged, not raised: the first request then connects on demand.
+    """
+    timings: dict[str, float] = {}
+
+    start = time.perf_counter()
+    await database.command("ping")
+    timings["mongo_ping"] = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    try:
+        await llm_service.warm_up(connect=settings.WARMUP_LLM_CONNECT)
+    except Exception as e:
+        logger.warning("LLM warm-up failed (%s), continuing", e)
+    timings["llm_client"] = (time.perf_counter() - start) * 1000
+
+    logger.info(
+        "Warm-up done: %s",
+        ", ".join(f"{step}={ms:.1f}ms" for step, ms in timings.items()),
+    )
+    return timings
+
@@ -0,0 +1,80 @@
+"""Per-turn time/allocation of rebuilding the message list vs. a cached PromptAssembler.
+
+Run from backend/: `python -m scripts.bench_prompt_assembly`.
+"""
+
+import time
+import tracemalloc
+from collections.abc import Callable
+
+from app.models.session import Message
+from app.prompts import stage2
+from app.prompts.assembler import PromptAssembler
+from app.prompts.builder import build_messages
+
+REPEATS = 200
+USER_ISSUE = "工作压力大"
+CONTENT = "嗯？具体是发生了什么呢？" * 4
+
+
+def rebuild(history: list[Message]) -> list[dict]:
+    """What a turn cost before: format the system prompt and convert the whole history."""
+    return build_messages(stage2.SYSTEM_PROMPT.format(user_issue=USER_ISSUE), history)
+
+
+def warm_assembler(history: list[Message]) -> PromptAssembler:
+    """Assembler that has seen every message but the last, as after the previous turn."""
+    assembler = PromptAssembler(stage2.SYSTEM_PROMPT.format(user_issue=USER_ISSUE))
+    assembler.messages(history[:-1])
+    return assembler
+
+
+def peak_bytes(fn: Callable[[], object]) -> int:
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def retained_bytes(history: list[Message]) -> int:
+    """Bytes a cached session keeps alive once its assembler has seen `history`."""
+    tracemalloc.start()
+    kept = PromptAssembler(stage2.SYSTEM_PROMPT.format(user_issue=USER_ISSUE))
+    kept.messages(history)
+    retained = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return retained
+
+
+def main() -> None:
+    print(
+        f"{'msgs':>6}{'rebuild us':>12}{'rebuild B':>12}"
+        f"{'cached us':>12}{'cached B':>12}{'retained B':>12}"
+    )
+    for length in (20, 200, 1000, 5000):
+        history = [
+            Message(role="user" if i % 2 == 0 else "ai", content=CONTENT) for i in range(length)
+        ]
+
+        start = time.perf_counter()
+        for _ in range(REPEATS):
+            rebuild(history)
+        rebuild_us = (time.perf_counter() - start) / REPEATS * 1e6
+
+        assemblers = [warm_assembler(history) for _ in range(REPEATS)]
+        start = time.perf_counter()
+        for assembler in assemblers:
+            assembler.messages(history)
+        cached_us = (time.perf_counter() - start) / REPEATS * 1e6
+
+        warm = warm_assembler(history)
+        print(
+            f"{length:>6}{rebuild_us:>12.1f}{peak_bytes(lambda: rebuild(history)):>12}"
+            f"{cached_us:>12.2f}{peak_bytes(lambda: warm.messages(history)):>12}"
+            f"{retained_bytes(history):>12}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""Per-package import-time report for `app.main` (wraps `python -X importtime`).
+
+Run from backend/: `python -m scripts.profile_imports`.
+"""
+
+import re
+import subprocess
+import sys
+from collections import defaultdict
+
+_IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|\s+(.+)")
+
+
+def profile_imports(module: str = "app.main") -> dict[str, int]:
+    """Import `module` in a fresh interpreter; return self time (us) per top-level package."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    totals: dict[str, int] = defaultdict(int)
+    for line in proc.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match:
+            totals[match.group(3).strip().split(".")[0]] += int(match.group(1))
+    return dict(sorted(totals.items(), key=lambda kv: kv[1], reverse=True))
+
+
+def main() -> None:
+    report = profile_imports()
+    total = sum(report.values())
+    print(f"{'package':<30}{'ms':>10}{'%':>8}")
+    for package, us in list(report.items())[:25]:
+        print(f"{package:<30}{us / 1000:>10.1f}{us / total * 100:>8.1f}")
+    print(f"{'total':<30}{total / 1000:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+import os
+import uuid
+from contextlib import asynccontextmanager
+
+import pytest
+
+TEST_MONGODB_URI = os.environ.get("TEST_MONGODB_URI", "mongodb://localhost:27017")
+# CI 设置该变量，Mongo 不可达时直接失败，避免整组测试被静默跳过
+TEST_MONGODB_REQUIRED = bool(os.environ.get("TEST_MONGODB_REQUIRED"))
+
+
+@asynccontextmanager
+async def mongo_test_db():
+    """Throwaway database on TEST_MONGODB_URI; skips the test when Mongo is unreachable."""
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    client = AsyncIOMotorClient(TEST_MONGODB_URI, serverSelectionTimeoutMS=500)
+    try:
+        await client.admin.command("ping")
+    except Exception:
+        client.close()
+        if TEST_MONGODB_REQUIRED:
+            pytest.fail(f"MongoDB not reachable at {TEST_MONGODB_URI}")
+        pytest.skip(f"MongoDB not reachable at {TEST_MONGODB_URI}")
+    name = f"talking_like_ai_test_{uuid.uuid4().hex[:8]}"
+    try:
+        yield client[name]
+    finally:
+        await client.drop_database(name)
+        client.close()
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def mongo_db():
+    async with mongo_test_db() as db:
+        yield db
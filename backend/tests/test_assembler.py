@@ -0,0 +1,55 @@
+from app.config import settings
+from app.models.session import Message
+from app.prompts import assembler
+from app.prompts.builder import build_messages
+
+
+def _history(n: int) -> list[Message]:
+    return [Message(role="user" if i % 2 == 0 else "ai", content=f"m{i}") for i in range(n)]
+
+
+def test_incremental_messages_match_full_rebuild():
+    history = _history(2)
+    prompt = assembler.PromptAssembler("sys")
+    assert prompt.messages(history) == build_messages("sys", history)
+    history += _history(3)[2:]
+    assert prompt.messages(history) == build_messages("sys", history)
+    assert prompt.messages(history, "extra") == build_messages("sys", history, "extra")
+    assert prompt.messages(history) == build_messages("sys", history)
+
+
+def test_shorter_history_rebuilds():
+    prompt = assembler.PromptAssembler("sys")
+    prompt.messages(_history(4))
+    assert prompt.messages(_history(1)) == build_messages("sys", _history(1))
+
+
+def test_system_prompt_is_formatted_once_per_session():
+    calls = []
+    for _ in range(3):
+        assembler.get_assembler("s1", "stage2", lambda: calls.append(1) or "sys")
+    assert calls == [1]
+    assembler.drop("s1")
+
+
+def test_transcript_does_not_populate_cache():
+    labels = {"assistant": "A", "user": "U"}
+    assert assembler.transcript("s2", "stage3", _history(2), labels) == "[U]: m0\n[A]: m1"
+    assert ("s2", "stage3") not in assembler._cache
+
+    assembler.get_assembler("s2", "stage3", lambda: "sys")
+    assert assembler.transcript("s2", "stage3", _history(2), labels) == "[U]: m0\n[A]: m1"
+    assembler.drop("s2")
+    assert ("s2", "stage3") not in assembler._cache
+
+
+def test_cache_evicts_least_recently_used(monkeypatch):
+    monkeypatch.setattr(settings, "PROMPT_CACHE_MAX_SESSIONS", 2)
+    for sid in ("a", "b"):
+        assembler.get_assembler(sid, "stage2", lambda: "sys")
+    assembler.get_assembler("a", "stage2", lambda: "sys")
+    assembler.get_assembler("c", "stage2", lambda: "sys")
+    assert ("b", "stage2") not in assembler._cache
+    assert ("a", "stage2") in assembler._cache
+    for sid in ("a", "c"):
+        assembler.drop(sid)
@@ -0,0 +1,19 @@
+from app.routes.session import _etag_matches
+from app.services.session_service import session_etag
+
+
+def test_etag_changes_with_every_revision():
+    assert session_etag(1) != session_etag(2)
+
+
+def test_etag_matches_weak_comparison():
+    etag = session_etag(3)
+    assert _etag_matches(etag, etag)
+    assert _etag_matches('"3"', etag)
+    assert _etag_matches('W/"1", W/"3"', etag)
+    assert _etag_matches("*", etag)
+
+
+def test_etag_does_not_match_substring():
+    assert not _etag_matches('W/"13"', session_etag(3))
+    assert not _etag_matches('W/"3', session_etag(3))
@@ -0,0 +1,143 @@
+"""N uvicorn workers sharing one Mongo instance (SHARED_STATE_BACKEND=mongo).
+
+Needs a reachable MongoDB at TEST_MONGODB_URI; skipped otherwise. CI runs it
+against a mongo service container (.github/workflows/backend-tests.yml). No LLM
+calls are made: every request used here is answered before the model is contacted.
+"""
+
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+from datetime import UTC, datetime
+from pathlib import Path
+
+import httpx
+import pytest
+from bson import ObjectId
+
+from tests.conftest import TEST_MONGODB_URI
+
+pytestmark = pytest.mark.anyio
+
+WORKERS = 3
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+async def server(mongo_db):
+    port = _free_port()
+    env = {
+        **os.environ,
+        "MONGODB_URI": TEST_MONGODB_URI,
+        "MONGODB_DB": mongo_db.name,
+        "SHARED_STATE_BACKEND": "mongo",
+        "WARMUP_LLM_CONNECT": "false",
+        "CHAT_RATE_LIMIT_PER_MINUTE": "5",
+        "SESSION_LOCK_TIMEOUT_SECONDS": "10",
+        "OPENAI_API_KEY": "test",
+    }
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app",
+         "--port", str(port), "--workers", str(WORKERS)],
+        cwd=BACKEND_DIR,
+        env=env,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        async with httpx.AsyncClient(base_url=base_url, timeout=30) as client:
+            for _ in range(300):
+                try:
+                    if (await client.get("/api/ready")).status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                await asyncio.sleep(0.1)
+            else:
+                pytest.fail("uvicorn workers did not become ready")
+            yield client, mongo_db
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+
+async def _insert_session(db, stage: str) -> str:
+    now = datetime.now(UTC)
+    result = await db["sessions"].insert_one({
+        "stage": stage,
+        "user_issue": "test",
+        "stage2_messages": [],
+        "stage3_messages": [],
+        "mood_ratings": [],
+        "annotations": [],
+        "created_at": now,
+        "updated_at": now,
+        "revision": 0,
+    })
+    return str(result.inserted_id)
+
+
+async def test_concurrent_writes_are_not_lost(server):
+    client, db = server
+    session_id = await _insert_session(db, "conversation")
+
+    responses = await asyncio.gather(*(
+        client.post(f"/api/sessions/{session_id}/stage2/mood", json={"value": i})
+        for i in range(30)
+    ))
+
+    assert {r.status_code for r in responses} <= {200, 409}
+    ok = sum(r.status_code == 200 for r in responses)
+    stored = await db["sessions"].find_one({"_id": ObjectId(session_id)})
+    assert len(stored["mood_ratings"]) == ok
+    assert stored["revision"] == ok
+
+
+async def test_rate_limit_is_shared_across_workers(server):
+    client, db = server
+    session_id = await _insert_session(db, "input")
+
+    first_window = int(time.time() // 60)
+    responses = await asyncio.gather(*(
+        client.post(f"/api/sessions/{session_id}/stage2/chat", json={"content": "hi"})
+        for _ in range(12)
+    ))
+    windows = int(time.time() // 60) - first_window + 1
+
+    # 通过限流的请求因阶段不对返回 409，其余被限流；跨分钟边界时可能落在两个窗口
+    assert {r.status_code for r in responses} <= {409, 429}
+    admitted = sum(r.status_code == 409 for r in responses)
+    assert admitted <= 5 * windows
+    if windows == 1:
+        assert admitted == 5
+
+
+async def test_long_poll_wakes_on_write_from_another_request(server):
+    client, db = server
+    session_id = await _insert_session(db, "conversation")
+    etag = (await client.get(f"/api/sessions/{session_id}")).headers["etag"]
+
+    async def write_soon():
+        await asyncio.sleep(0.5)
+        await client.post(f"/api/sessions/{session_id}/stage2/mood", json={"value": 50})
+
+    poll, _ = await asyncio.gather(
+        client.get(
+            f"/api/sessions/{session_id}",
+            params={"wait": 10},
+            headers={"If-None-Match": etag},
+        ),
+        write_soon(),
+    )
+
+    assert poll.status_code == 200
+    assert poll.headers["etag"] != etag
+    assert len(poll.json()["mood_ratings"]) == 1
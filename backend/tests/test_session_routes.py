@@ -0,0 +1,90 @@
+import httpx
+import pytest
+from beanie import init_beanie
+
+from app.main import app
+from app.models import document_models
+from app.models.session import Message, Session, SessionStage
+from app.services import shared_state
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def client(mongo_db, monkeypatch):
+    await init_beanie(database=mongo_db, document_models=document_models)
+    monkeypatch.setattr(shared_state, "_state", shared_state.InProcessState())
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        yield client
+
+
+async def _conversation_session(n_messages: int) -> str:
+    session = Session(
+        stage=SessionStage.CONVERSATION,
+        user_issue="test",
+        stage2_messages=[
+            Message(role="user" if i % 2 == 0 else "ai", content=f"m{i}")
+            for i in range(n_messages)
+        ],
+    )
+    await session.insert()
+    return str(session.id)
+
+
+async def test_since_index_returns_only_newer_messages(client):
+    session_id = await _conversation_session(4)
+
+    full = (await client.get(f"/api/sessions/{session_id}")).json()
+    tail = (await client.get(
+        f"/api/sessions/{session_id}", params={"stage2_since_index": 2}
+    )).json()
+
+    assert [m["content"] for m in full["stage2_messages"]] == ["m0", "m1", "m2", "m3"]
+    assert [m["content"] for m in tail["stage2_messages"]] == ["m2", "m3"]
+    assert tail["stage"] == "conversation"
+    assert tail["user_issue"] == "test"
+
+
+async def test_since_index_beyond_length_returns_empty_list(client):
+    session_id = await _conversation_session(2)
+
+    resp = await client.get(f"/api/sessions/{session_id}", params={"stage2_since_index": 10})
+
+    assert resp.status_code == 200
+    assert resp.json()["stage2_messages"] == []
+
+
+async def test_matching_if_none_match_returns_304(client):
+    session_id = await _conversation_session(2)
+    first = await client.get(f"/api/sessions/{session_id}")
+
+    again = await client.get(
+        f"/api/sessions/{session_id}", headers={"If-None-Match": first.headers["etag"]}
+    )
+
+    assert again.status_code == 304
+    assert again.headers["etag"] == first.headers["etag"]
+    assert again.content == b""
+
+
+async def test_write_bumps_revision_and_etag(client):
+    session_id = await _conversation_session(2)
+    first = await client.get(f"/api/sessions/{session_id}")
+
+    rated = await client.post(f"/api/sessions/{session_id}/stage2/mood", json={"value": 60})
+    after = await client.get(
+        f"/api/sessions/{session_id}", headers={"If-None-Match": first.headers["etag"]}
+    )
+
+    assert rated.json()["revision"] == first.json()["revision"] + 1
+    assert after.status_code == 200
+    assert after.headers["etag"] != first.headers["etag"]
+    assert after.json()["revision"] == rated.json()["revision"]
+    assert len(after.json()["mood_ratings"]) == 1
+
+
+async def test_unknown_session_is_404(client):
+    resp = await client.get("/api/sessions/000000000000000000000000")
+
+    assert resp.status_code == 404
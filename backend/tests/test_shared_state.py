@@ -0,0 +1,120 @@
+import anyio
+import pytest
+
+from app.exceptions import ResourceBusyError
+from app.services import shared_state
+from app.services.shared_state import InProcessState, MongoState
+from tests.conftest import mongo_test_db
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture(params=["memory", "mongo"])
+async def state(request):
+    if request.param == "memory":
+        yield InProcessState()
+        return
+    async with mongo_test_db() as db:
+        state = MongoState(db, poll_interval=0.01)
+        await state.init()
+        yield state
+
+
+async def test_lock_is_exclusive(state):
+    async with state.lock("k"):
+        with pytest.raises(ResourceBusyError):
+            await state.acquire("k")
+        with pytest.raises(ResourceBusyError):
+            await state.acquire("k", timeout=0.05)
+    lease = await state.acquire("k")
+    await lease.release()
+
+
+async def test_lock_keys_are_independent(state):
+    async with state.lock("a"), state.lock("b"):
+        pass
+
+
+async def test_release_is_idempotent(state):
+    lease = await state.acquire("k")
+    await lease.release()
+    other = await state.acquire("k")
+    await lease.release()  # 不能误释放别人的锁
+    with pytest.raises(ResourceBusyError):
+        await state.acquire("k")
+    await other.release()
+
+
+async def test_lock_released_when_holder_is_cancelled(state):
+    with anyio.CancelScope() as scope:
+        async with state.lock("k"):
+            scope.cancel()
+            await anyio.sleep(1)
+    lease = await state.acquire("k")
+    await lease.release()
+
+
+async def test_waiter_gets_lock_after_release(state):
+    lease = await state.acquire("k")
+
+    async def release_soon():
+        await anyio.sleep(0.05)
+        await lease.release()
+
+    async with anyio.create_task_group() as tg:
+        tg.start_soon(release_soon)
+        async with state.lock("k", timeout=2):
+            pass
+
+
+async def test_incr_counts_per_key(state):
+    assert [await state.incr("a", 60) for _ in range(3)] == [1, 2, 3]
+    assert await state.incr("b", 60) == 1
+
+
+async def test_wait_for_change_wakes_on_publish(state):
+    async def publish_soon():
+        await anyio.sleep(0.05)
+        await state.publish("ch", 3)
+
+    async with anyio.create_task_group() as tg:
+        tg.start_soon(publish_soon)
+        with anyio.fail_after(2):
+            assert await state.wait_for_change("ch", 2, timeout=5) == 3
+
+
+async def test_wait_for_change_times_out(state):
+    await state.publish("ch", 1)
+    assert await state.wait_for_change("ch", 1, timeout=0.05) == 1
+    assert await state.wait_for_change("ch", 0, timeout=0.05) == 1
+
+
+async def test_publish_never_moves_backwards(state):
+    await state.publish("ch", 5)
+    await state.publish("ch", 4)
+    assert await state.wait_for_change("ch", 0, timeout=0) == 5
+
+
+async def test_in_process_versions_are_bounded(monkeypatch):
+    monkeypatch.setattr(shared_state, "_MAX_IN_PROCESS_ENTRIES", 3)
+    state = InProcessState()
+    for i in range(5):
+        await state.publish(f"ch{i}", 1)
+    await state.publish("ch2", 2)
+    await state.publish("ch5", 1)
+
+    assert list(state._versions) == ["ch4", "ch2", "ch5"]
+    assert await state.wait_for_change("ch0", 0, timeout=0) == 0
+
+
+async def test_mongo_lease_outlives_ttl_while_held(monkeypatch):
+    from app.config import settings
+
+    monkeypatch.setattr(settings, "SHARED_STATE_LOCK_TTL_SECONDS", 0.3)
+    async with mongo_test_db() as db:
+        state = MongoState(db, poll_interval=0.01)
+        await state.init()
+        async with state.lock("k"):
+            await anyio.sleep(1)
+            with pytest.raises(ResourceBusyError):
+                await state.acquire("k")